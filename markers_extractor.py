@@ -7,78 +7,210 @@
 import os
 import csv
 import sys
+import mmap
+import struct
+import threading
 import xml.etree.ElementTree as ET
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 
-def install_required_packages():
-    """Устанавливает необходимые пакеты, если они не установлены"""
-    required_packages = ['wavinfo']
-    for package in required_packages:
-        try:
-            __import__(package)
-            print(f"✓ {package} уже установлен")
-        except ImportError:
-            print(f"Устанавливаю {package}...")
-            try:
-                subprocess.check_call([sys.executable, "-m", "pip", "install", package])
-                print(f"✓ {package} успешно установлен")
-            except subprocess.CalledProcessError:
-                print(f"✗ Ошибка установки {package}")
-                return False
-    return True
-
-def parse_sesx_file(sesx_file_path: str) -> Tuple[Dict[str, int], List[str]]:
+try:
+    from wavinfo import WavInfoReader
+except ImportError:
+    sys.exit("Не найден пакет wavinfo. Установите его командой: pip install wavinfo")
+
+try:
+    # lxml разбирает XML на C и позволяет потоково обходить нужные теги
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Варианты написания расширения WAV, встречающиеся в проектах
+WAV_EXTENSIONS = ('.wav', '.WAV', '.Wav')
+
+# Повторяющиеся строки маркеров хранятся в одном экземпляре
+_CUE = sys.intern('Cue')
+_FILENAME_CACHE: Dict[str, str] = {}
+_TIME_FORMAT_CACHE: Dict[int, str] = {}
+
+def _iter_sesx_elements(sesx_file_path: str):
     """
-    Парсит SESX файл и извлекает информацию о клипах и пути к WAV файлам
+    Последовательно отдает элементы audioClip и file из SESX файла
     Args:
         sesx_file_path: Путь к SESX файлу
     Returns:
-        Tuple[словарь_клипов, список_путей_к_wav]
+        Генератор XML элементов
     """
-    clips_info = {}
-    wav_files = []
-    try:
-        # Парсим XML
-        tree = ET.parse(sesx_file_path)
-        root = tree.getroot()
+    if etree is None:
+        # Запасной вариант без lxml: один проход по дереву вместо двух findall
+        root = ET.parse(sesx_file_path).getroot()
+        for elem in root.iter():
+            if elem.tag in ('audioClip', 'file'):
+                yield elem
+        return
+
+    # Потоковый разбор: дерево целиком в памяти не строится
+    for _, elem in etree.iterparse(sesx_file_path, events=('end',), tag=('audioClip', 'file')):
+        yield elem
+        # Освобождаем уже обработанный элемент и его предыдущих соседей
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
 
+def parse_sesx_file(sesx_file_path: str) -> Dict[str, Dict]:
+    """
+    Парсит SESX файл и сопоставляет клипы с путями к WAV файлам
+    Args:
+        sesx_file_path: Путь к SESX файлу
+    Returns:
+        Словарь {имя_в_нижнем_регистре: {'name': имя_клипа, 'start': startPoint, 'wavs': пути_к_wav}}.
+        Для WAV файла без клипа 'start' равен None, для клипа без файла 'wavs' пуст
+    """
+    clips = {}
+    try:
         print(f"\n=== Парсинг SESX файла ===")
 
-        # Ищем все audioClip элементы
-        for audio_clip in root.findall('.//audioClip'):
-            name = audio_clip.get('name', '')
-            start_point = audio_clip.get('startPoint', 0)
-            # Очищаем имя файла (убираем расширение если есть)
-            clean_name = name.replace('.WAV', '').replace('.wav', '')
-            if clean_name and start_point:
-                clips_info[clean_name] = int(float(start_point))
-                print(f"  Клип: {clean_name} -> startPoint: {start_point}")
-
-        # Ищем все file элементы с WAV файлами
-        for file_elem in root.findall('.//file'):
-            relative_path = file_elem.get('relativePath', '')
-            if relative_path.lower().endswith('.wav'):
-                # Получаем абсолютный путь к WAV файлу
-                sesx_dir = os.path.dirname(os.path.abspath(sesx_file_path))
-                wav_path = os.path.join(sesx_dir, relative_path)
-                if os.path.exists(wav_path):
-                    wav_files.append(wav_path)
+        # Пути к WAV файлам указаны относительно папки проекта
+        sesx_dir = os.path.dirname(os.path.abspath(sesx_file_path))
+
+        # Клипы и файлы могут идти в любом порядке, поэтому запись создается
+        # тем элементом, который встретился первым
+        for elem in _iter_sesx_elements(sesx_file_path):
+            if elem.tag == 'audioClip':
+                name = elem.get('name', '')
+                start_point = elem.get('startPoint', 0)
+                # Очищаем имя файла (убираем расширение если есть)
+                clean_name = os.path.splitext(name)[0] if name.endswith(WAV_EXTENSIONS) else name
+                if clean_name and start_point:
+                    clip = clips.setdefault(clean_name.lower(), {'name': clean_name, 'start': None, 'wavs': []})
+                    clip['name'] = clean_name
+                    clip['start'] = int(float(start_point))
+                    print(f"  Клип: {clean_name} -> startPoint: {start_point}")
+
+            elif elem.tag == 'file':
+                relative_path = elem.get('relativePath', '')
+                if relative_path.endswith(WAV_EXTENSIONS):
+                    stem = os.path.splitext(os.path.basename(relative_path))[0]
+                    clip = clips.setdefault(stem.lower(), {'name': stem, 'start': None, 'wavs': []})
+                    # Получаем абсолютный путь к WAV файлу. Наличие файла
+                    # проверяется позже, перед его чтением. Одноименные файлы
+                    # из разных папок сохраняются все
+                    clip['wavs'].append(os.path.join(sesx_dir, relative_path))
                     print(f"  WAV файл: {relative_path}")
 
-        print(f"Найдено клипов: {len(clips_info)}")
-        print(f"Найдено WAV файлов: {len(wav_files)}")
+        print(f"Найдено клипов: {sum(clip['start'] is not None for clip in clips.values())}")
+        print(f"Найдено WAV файлов: {sum(len(clip['wavs']) for clip in clips.values())}")
 
     except Exception as e:
         print(f"Ошибка при парсинге SESX файла: {e}")
-    return clips_info, wav_files
+    return clips
+
+# Структура точки cue: id, position, fccChunk, chunkStart, blockStart, sampleOffset
+_CUE_POINT = struct.Struct('<II4sIII')
+
+def _read_cues_fast(wav_file_path: str) -> Tuple[int, List[Tuple[int, int]], Dict[int, str], Dict[int, int]]:
+    """
+    Читает маркеры напрямую из RIFF чанков WAV файла (fmt, cue, LIST/adtl)
+    Args:
+        wav_file_path: Путь к WAV файлу
+    Returns:
+        Tuple[sample_rate, список_(id, позиция), словарь_названий, словарь_длин]
+    Raises:
+        ValueError, struct.error: если файл не является обычным RIFF/WAVE
+    """
+    sample_rate = None
+    cue_list = []
+    labels_dict = {}
+    ranges_dict = {}
+    with open(wav_file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[0:4] != b'RIFF' or mm[8:12] != b'WAVE':
+            raise ValueError("не RIFF/WAVE файл")
+
+        end = len(mm)
+        offset = 12
+        while offset + 8 <= end:
+            chunk_id, chunk_size = struct.unpack_from('<4sI', mm, offset)
+            body = offset + 8
+
+            if chunk_id == b'fmt ':
+                sample_rate = struct.unpack_from('<I', mm, body + 4)[0]
+
+            elif chunk_id == b'cue ':
+                count = struct.unpack_from('<I', mm, body)[0]
+                if 4 + count * _CUE_POINT.size > chunk_size:
+                    raise ValueError("число точек cue не помещается в чанк")
+                data = mm[body + 4:body + 4 + count * _CUE_POINT.size]
+                cue_list = [(cue[0], cue[1]) for cue in _CUE_POINT.iter_unpack(data)]
+
+            elif chunk_id == b'LIST' and mm[body:body + 4] == b'adtl':
+                sub_offset = body + 4
+                list_end = min(body + chunk_size, end)
+                while sub_offset + 8 <= list_end:
+                    sub_id, sub_size = struct.unpack_from('<4sI', mm, sub_offset)
+                    sub_body = sub_offset + 8
+                    if sub_id == b'labl':
+                        name = struct.unpack_from('<I', mm, sub_body)[0]
+                        text = mm[sub_body + 4:min(sub_body + sub_size, list_end)]
+                        labels_dict[name] = text.decode('latin_1').rstrip('\0')
+                    elif sub_id == b'ltxt':
+                        name, length = struct.unpack_from('<II', mm, sub_body)
+                        ranges_dict[name] = length
+                    # Чанки выравниваются по четной границе
+                    sub_offset = sub_body + sub_size + (sub_size & 1)
+
+            offset = body + chunk_size + (chunk_size & 1)
+
+    if not sample_rate:
+        raise ValueError("fmt чанк не найден")
+    return sample_rate, cue_list, labels_dict, ranges_dict
+
+def _read_cues_wavinfo(wav_file_path: str) -> Tuple[int, List[Tuple[int, int]], Dict[int, str], Dict[int, int]]:
+    """
+    Читает маркеры WAV файла с помощью wavinfo
+    Args:
+        wav_file_path: Путь к WAV файлу
+    Returns:
+        Tuple[sample_rate, список_(id, позиция), словарь_названий, словарь_длин]
+    """
+    # Открываем WAV файл с помощью wavinfo
+    wav = WavInfoReader(wav_file_path)
+
+    # Получаем sample rate для вычисления времени
+    sample_rate = wav.fmt.sample_rate if hasattr(wav.fmt, 'sample_rate') else 48000
+    cue_list = []
+    labels_dict = {}
+    ranges_dict = {}
+    # Проверяем cues (основной способ получения маркеров в wavinfo)
+    if hasattr(wav, 'cues') and wav.cues:
+        if hasattr(wav.cues, 'cues'):
+            cue_list = [(cue.name, getattr(cue, 'position', 0)) for cue in wav.cues.cues]
+            labels_list = wav.cues.labels if hasattr(wav.cues, 'labels') else []
+            ranges_list = wav.cues.ranges if hasattr(wav.cues, 'ranges') else []
+
+            # Создаем словари для связи позиций с названиями и длинами.
+            # Атрибуты у объектов wavinfo стабильны, поэтому медленные
+            # проверки hasattr нужны только если быстрый путь не сработал
+            try:
+                labels_dict = {label.name: label.text for label in labels_list}
+            except AttributeError:
+                labels_dict = {label.name: label.text for label in labels_list
+                               if hasattr(label, 'name') and hasattr(label, 'text')}
+
+            try:
+                ranges_dict = {range_item.name: range_item.length for range_item in ranges_list}
+            except AttributeError:
+                ranges_dict = {range_item.name: range_item.length for range_item in ranges_list
+                               if hasattr(range_item, 'name') and hasattr(range_item, 'length')}
+
+    return sample_rate, cue_list, labels_dict, ranges_dict
 
 def extract_markers_from_wav(wav_file_path: str) -> List[Dict]:
     """
-    Извлекает маркеры из WAV файла с помощью wavinfo
+    Извлекает маркеры из WAV файла. Чанки читаются напрямую, wavinfo
+    используется для файлов, которые не удалось разобрать (например, RF64)
     Args:
         wav_file_path: Путь к WAV файлу
     Returns:
@@ -86,51 +218,36 @@ def extract_markers_from_wav(wav_file_path: str) -> List[Dict]:
     """
     markers = []
     try:
-        # Импортируем wavinfo
-        from wavinfo import WavInfoReader
-
-        # Открываем WAV файл с помощью wavinfo
-        wav = WavInfoReader(wav_file_path)
-
-        # Получаем sample rate для вычисления времени
-        sample_rate = wav.fmt.sample_rate if hasattr(wav.fmt, 'sample_rate') else 48000
-        # Проверяем cues (основной способ получения маркеров в wavinfo)
-        if hasattr(wav, 'cues') and wav.cues:
-            if hasattr(wav.cues, 'cues'):
-                cue_list = wav.cues.cues
-                labels_list = wav.cues.labels if hasattr(wav.cues, 'labels') else []
-                ranges_list = wav.cues.ranges if hasattr(wav.cues, 'ranges') else []
-
-                # Создаем словари для связи позиций с названиями и длинами
-                labels_dict = {}
-                ranges_dict = {}
-
-                for label in labels_list:
-                    if hasattr(label, 'name') and hasattr(label, 'text'):
-                        labels_dict[label.name] = label.text
-
-                for range_item in ranges_list:
-                    if hasattr(range_item, 'name') and hasattr(range_item, 'length'):
-                        ranges_dict[range_item.name] = range_item.length
-
-                for i, cue_marker in enumerate(cue_list):
-                    marker_name = cue_marker.name
-                    marker_text = labels_dict.get(marker_name, f'Marker {marker_name}')
-
-                    # Получаем длину диапазона, если есть
-                    duration = ranges_dict.get(marker_name, 0)
-
-                    marker_info = {
-                        'filename': os.path.basename(wav_file_path),
-                        'name': marker_text,
-                        'position': getattr(cue_marker, 'position', 0),
-                        'time_seconds': getattr(cue_marker, 'position', 0) / sample_rate,
-                        'time_formatted': format_time(getattr(cue_marker, 'position', 0) / sample_rate),
-                        'type': 'Cue',
-                        'sample_rate': sample_rate,
-                        'duration': duration  # Длина диапазона или 0 для обычных маркеров
-                    }
-                    markers.append(marker_info)
+        try:
+            sample_rate, cue_list, labels_dict, ranges_dict = _read_cues_fast(wav_file_path)
+        except (ValueError, struct.error):
+            sample_rate, cue_list, labels_dict, ranges_dict = _read_cues_wavinfo(wav_file_path)
+
+        # Локальные ссылки для горячего цикла
+        labels_get = labels_dict.get
+        ranges_get = ranges_dict.get
+        basename = os.path.basename(wav_file_path)
+        filename = _FILENAME_CACHE.setdefault(basename, sys.intern(basename))
+
+        for marker_name, position in cue_list:
+            marker_text = labels_get(marker_name, f'Marker {marker_name}')
+
+            # Получаем длину диапазона, если есть
+            duration = ranges_get(marker_name, 0)
+
+            time_seconds = position / sample_rate
+
+            marker_info = {
+                'filename': filename,
+                'name': marker_text,
+                'position': position,
+                'time_seconds': time_seconds,
+                'time_formatted': format_time(time_seconds),
+                'type': _CUE,
+                'sample_rate': sample_rate,
+                'duration': duration  # Длина диапазона или 0 для обычных маркеров
+            }
+            markers.append(marker_info)
 
     except Exception as e:
         print(f"Ошибка при чтении файла {wav_file_path}: {e}")
@@ -145,10 +262,9 @@ def format_time(seconds: float) -> str:
         Отформатированная строка времени
     """
     if seconds < 0:
-        return "00:00.000"
-    minutes = int(seconds // 60)
-    secs = seconds % 60
-    return f"{minutes:02d}:{secs:06.3f}"
+        seconds = 0.0
+    minutes, secs = divmod(seconds, 60.0)
+    return f"{int(minutes):02d}:{secs:06.3f}"
 
 def save_markers_to_csv(markers: List[Dict], output_file: str):
     """
@@ -161,30 +277,27 @@ def save_markers_to_csv(markers: List[Dict], output_file: str):
         print("Маркеры не найдены")
         return
 
-    # Формируем строки для нового формата
-    rows = []
-    header = ["Name", "Start", "Duration", "Time Format", "Type", "Description"]
-    rows.append(header)
-    for marker in markers:
-        sample_rate = marker.get('sample_rate', 48000)
-        duration = marker.get('duration', 0)
-        name = marker.get('name', '')
-        start = int(marker.get('position', 0))
-        time_format = f"{sample_rate} Hz"
-        type_str = "Cue"
-        description = marker.get('description', '')
-
-        # Добавляем информацию о диапазоне в описание, если есть
-        if duration > 0:
-            duration_seconds = duration / sample_rate
-            description = f"Range: {format_time(duration_seconds)}"
-        row = [name, start, duration, time_format, type_str, description]
-        rows.append(row)
-
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        for row in rows:
-            line = '\t'.join(str(cell) for cell in row)
-            csvfile.write(line + '\n')
+    def iter_rows():
+        """Формирует строки нового формата за один проход"""
+        for marker in markers:
+            sample_rate = marker.get('sample_rate', 48000)
+            duration = marker.get('duration', 0)
+            description = marker.get('description', '')
+
+            # Добавляем информацию о диапазоне в описание, если есть
+            if duration > 0:
+                description = f"Range: {format_time(duration / sample_rate)}"
+            time_format = _TIME_FORMAT_CACHE.get(sample_rate)
+            if time_format is None:
+                time_format = _TIME_FORMAT_CACHE.setdefault(sample_rate, sys.intern(f"{sample_rate} Hz"))
+            yield (marker.get('name', ''), int(marker.get('position', 0)), duration,
+                   time_format, _CUE, description)
+
+    # csv.writer реализован на C и экранирует табуляции и переводы строк в названиях
+    with open(output_file, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
+        writer = csv.writer(csvfile, delimiter='\t', lineterminator='\n', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(["Name", "Start", "Duration", "Time Format", "Type", "Description"])
+        writer.writerows(iter_rows())
 
     print(f"Маркеры сохранены в файл: {output_file}")
 
@@ -195,9 +308,12 @@ class MarkersExtractorGUI:
         self.root.geometry("800x500")
         # Переменные
         self.sesx_file_path = tk.StringVar()
-        self.clips_info = {}
-        self.wav_files = []
+        self.clips = {}
         self.all_markers = []
+        # Кэш маркеров: путь к WAV -> (время изменения файла, маркеры)
+        self._marker_cache = {}
+        # Элементы дерева, маркеры которых еще не загружены: id -> путь к WAV
+        self._pending_items = {}
         self.create_widgets()
 
     def create_widgets(self):
@@ -228,10 +344,12 @@ class MarkersExtractorGUI:
         button_frame.grid(row=3, column=0, columnspan=3, pady=2)
         button_frame.columnconfigure(0, weight=1)
         button_frame.columnconfigure(1, weight=1)
-        ttk.Button(button_frame, text="Анализировать SESX файл",
-                   command=self.analyze_sesx_file).grid(row=0, column=0, padx=(0, 5))
-        ttk.Button(button_frame, text="Извлечь маркеры и создать CSV",
-                   command=self.extract_markers).grid(row=0, column=1, padx=(5, 0))
+        self.analyze_button = ttk.Button(button_frame, text="Анализировать SESX файл",
+                                         command=self.analyze_sesx_file)
+        self.analyze_button.grid(row=0, column=0, padx=(0, 5))
+        self.extract_button = ttk.Button(button_frame, text="Извлечь маркеры и создать CSV",
+                                         command=self.extract_markers)
+        self.extract_button.grid(row=0, column=1, padx=(5, 0))
         # Пояснение под кнопками
         extract_note = ttk.Label(
             main_frame,
@@ -250,10 +368,31 @@ class MarkersExtractorGUI:
         self.tree.column("start", width=10)
         self.tree.column("markers", width=20)
         self.tree.grid(row=5, column=0, columnspan=3, sticky='nsew', pady=2)
+        # Маркеры клипа читаются только при первом раскрытии узла
+        self.tree.bind("<<TreeviewOpen>>", self.on_tree_open)
         # Скроллбар для treeview
         scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self.tree.yview)
         scrollbar.grid(row=5, column=3, sticky='ns')
         self.tree.configure(yscrollcommand=scrollbar.set)
+        # Прогресс обработки WAV файлов
+        self.progress = ttk.Progressbar(main_frame, mode='determinate')
+        self.progress.grid(row=6, column=0, columnspan=3, sticky='we', pady=2)
+
+    def get_wav_markers(self, wav_path: str) -> List[Dict]:
+        """
+        Возвращает маркеры WAV файла, повторно не читая неизмененный файл
+        Args:
+            wav_path: Путь к WAV файлу
+        Returns:
+            Список словарей с информацией о маркерах
+        """
+        mtime = os.path.getmtime(wav_path)
+        cached = self._marker_cache.get(wav_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        markers = extract_markers_from_wav(wav_path)
+        self._marker_cache[wav_path] = (mtime, markers)
+        return markers
 
     def browse_sesx_file(self):
         filename = filedialog.askopenfilename(
@@ -273,106 +412,174 @@ class MarkersExtractorGUI:
             messagebox.showerror("Ошибка", "SESX файл не найден")
             return
 
-        try:
-            self.root.update()
+        # Тяжелая работа выполняется в фоне, чтобы окно не зависало
+        self.set_busy(True)
+        threading.Thread(target=self._do_analyze, args=(sesx_path,), daemon=True).start()
 
+    def _do_analyze(self, sesx_path: str):
+        """Парсит SESX файл и собирает список клипов в фоновом потоке"""
+        try:
             # Парсим SESX файл
-            self.clips_info, self.wav_files = parse_sesx_file(sesx_path)
-
-            # Очищаем treeview
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-
-            # Отображаем только клипы с WAV файлами и маркерами
-            for clip_name, start_point in self.clips_info.items():
-                # Ищем соответствующий WAV файл
-                wav_file = None
-                for wav_path in self.wav_files:
-                    if clip_name.lower() in os.path.basename(wav_path).lower():
-                        wav_file = wav_path
-                        break
-
-                # Проверяем, есть ли WAV файл и маркеры
-                if wav_file and os.path.exists(wav_file):
-                    markers = extract_markers_from_wav(wav_file)
-                    if markers:  # Показываем только клипы с маркерами
-                        # Добавляем клип в treeview
-                        clip_item = self.tree.insert("", "end", text=clip_name,
-                                                   values=(start_point, f"Найдено маркеров: {len(markers)}"))
-
-                        # Добавляем маркеры как дочерние элементы
-                        for marker in markers:
-                            marker_text = f"{marker['name']} - {marker['time_formatted']}"
-                            if marker['duration'] > 0:
-                                duration_seconds = marker['duration'] / marker['sample_rate']
-                                marker_text += f" (диапазон: {format_time(duration_seconds)})"
-                            self.tree.insert(clip_item, "end", text=marker_text)
+            clips = parse_sesx_file(sesx_path)
+
+            # Отображаем клипы с WAV файлами. Маркеры не читаются до раскрытия
+            # клипа в дереве, поэтому анализ не зависит от размера WAV файлов
+            rows = []
+            for clip in clips.values():
+                if clip['start'] is None:
+                    continue
+                # В дереве показывается первый найденный файл клипа
+                wav_file = next((path for path in clip['wavs'] if os.path.exists(path)), None)
+                if wav_file:
+                    rows.append((clip['name'], clip['start'], wav_file))
+
+            self.root.after(0, self._finish_analyze, clips, rows)
 
         except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка при анализе SESX файла: {e}")
+            self.root.after(0, self._finish_with_message, messagebox.showerror,
+                            "Ошибка", f"Ошибка при анализе SESX файла: {e}")
+
+    def _finish_analyze(self, clips: Dict[str, Dict], rows: List[Tuple[str, int, str]]):
+        """Применяет результат анализа в главном потоке"""
+        self.clips = clips
+        self.populate_tree(rows)
+        # Анализ не читает WAV файлы, поэтому прогресс прошлого извлечения сбрасывается
+        self.set_progress(0)
+        self.set_busy(False)
+
+    def _finish_with_message(self, show, title: str, message: str):
+        """Завершает фоновую операцию и показывает сообщение в главном потоке"""
+        self.set_busy(False)
+        show(title, message)
+
+    def set_busy(self, busy: bool):
+        """Блокирует кнопки на время фоновой операции"""
+        state = ['disabled'] if busy else ['!disabled']
+        self.analyze_button.state(state)
+        self.extract_button.state(state)
+
+    def set_progress(self, value: int, maximum: Optional[int] = None):
+        """Обновляет индикатор прогресса"""
+        if maximum is not None:
+            self.progress.configure(maximum=max(maximum, 1))
+        self.progress.configure(value=value)
+
+    def populate_tree(self, rows: List[Tuple[str, int, str]]):
+        """
+        Заполняет treeview клипами с заглушками вместо маркеров
+        Args:
+            rows: Список кортежей (имя_клипа, startPoint, путь_к_wav)
+        """
+        self.tree.delete(*self.tree.get_children())
+        self._pending_items = {}
+        for clip_name, start_point, wav_file in rows:
+            clip_item = self.tree.insert("", "end", text=clip_name, values=(start_point, "..."))
+            # Заглушка нужна, чтобы у клипа появилась кнопка раскрытия
+            self.tree.insert(clip_item, "end", text="Загрузка...")
+            self._pending_items[clip_item] = wav_file
+
+    def on_tree_open(self, event):
+        """Загружает маркеры клипа при первом раскрытии узла"""
+        clip_item = self.tree.focus()
+        wav_file = self._pending_items.pop(clip_item, None)
+        if wav_file is None:
+            return
+
+        # Чтение файла может быть медленным (например, на сетевом диске),
+        # поэтому выполняется в фоне
+        threading.Thread(target=self._do_load_markers, args=(clip_item, wav_file), daemon=True).start()
+
+    def _do_load_markers(self, clip_item: str, wav_file: str):
+        """Читает маркеры клипа в фоновом потоке"""
+        # Повторное раскрытие и последующее извлечение берут маркеры из кэша
+        markers = self.get_wav_markers(wav_file) if os.path.exists(wav_file) else []
+
+        marker_texts = []
+        for marker in markers:
+            marker_text = f"{marker['name']} - {marker['time_formatted']}"
+            if marker['duration'] > 0:
+                duration_seconds = marker['duration'] / marker['sample_rate']
+                marker_text += f" (диапазон: {format_time(duration_seconds)})"
+            marker_texts.append(marker_text)
+
+        self.root.after(0, self._insert_markers, clip_item, marker_texts)
+
+    def _insert_markers(self, clip_item: str, marker_texts: List[str]):
+        """Заменяет заглушку клипа его маркерами в главном потоке"""
+        # Клип мог исчезнуть, если за время чтения проект проанализировали заново
+        if not self.tree.exists(clip_item):
+            return
+
+        self.tree.delete(*self.tree.get_children(clip_item))
+        start_point = self.tree.item(clip_item)['values'][0]
+        self.tree.item(clip_item, values=(start_point, f"Найдено маркеров: {len(marker_texts)}"))
+
+        if not marker_texts:
+            self.tree.insert(clip_item, "end", text="Маркеры не найдены")
+        # Добавляем маркеры как дочерние элементы
+        for marker_text in marker_texts:
+            self.tree.insert(clip_item, "end", text=marker_text)
 
     def extract_markers(self):
-        if not self.clips_info or not self.wav_files:
+        if not self.clips:
             messagebox.showerror("Ошибка", "Сначала проанализируйте SESX файл")
             return
 
-        try:
-            self.root.update()
+        sesx_path = self.sesx_file_path.get()
+        self.set_busy(True)
+        threading.Thread(target=self._do_extract, args=(sesx_path, self.clips), daemon=True).start()
 
-            sesx_path = self.sesx_file_path.get()
+    def _do_extract(self, sesx_path: str, clips: Dict[str, Dict]):
+        """Извлекает маркеры и сохраняет CSV в фоновом потоке"""
+        try:
             sesx_dir = os.path.dirname(sesx_path)
             sesx_name = os.path.splitext(os.path.basename(sesx_path))[0]
             output_file = os.path.join(sesx_dir, f"{sesx_name} timeline markers.csv")
 
             all_markers = []
 
-            # Обрабатываем каждый WAV файл
-            for wav_file in self.wav_files:
-                if not os.path.exists(wav_file):
-                    continue
-
-                filename = os.path.basename(wav_file)
-                clean_filename = filename.replace('.wav', '').replace('.WAV', '')
-
-                # Ищем соответствующий клип в SESX
-                clip_start = self.clips_info.get(clean_filename, 0)
-
-                # Извлекаем маркеры из WAV
-                markers = extract_markers_from_wav(wav_file)
-
-                if markers:
-                    # Смещаем таймкоды маркеров
-                    for marker in markers:
-                        # Добавляем позицию клипа к позиции маркера
-                        original_position = marker['position']
-                        marker['position'] = original_position + clip_start
-
-                        # Пересчитываем время
-                        sample_rate = marker['sample_rate']
-                        marker['time_seconds'] = marker['position'] / sample_rate
-                        marker['time_formatted'] = format_time(marker['time_seconds'])
-                    all_markers.extend(markers)
+            # WAV файлы без клипа выгружаются с нулевым смещением
+            wav_items = [(clip['start'] or 0, wav_file) for clip in clips.values()
+                         for wav_file in clip['wavs'] if os.path.exists(wav_file)]
+            self.root.after(0, self.set_progress, 0, len(wav_items))
+
+            # Читаем WAV файлы параллельно: чтение заголовков упирается в диск
+            if wav_items:
+                with ThreadPoolExecutor(max_workers=min(16, len(wav_items))) as executor:
+                    wav_markers = executor.map(self.get_wav_markers,
+                                               [wav_file for _, wav_file in wav_items])
+
+                    # Обрабатываем каждый WAV файл по мере готовности
+                    for done, ((clip_start, _), markers) in enumerate(zip(wav_items, wav_markers), 1):
+                        # Смещаем таймкоды маркеров на позицию клипа. Копирование и
+                        # пересчет времени делаются за один проход, кэш не меняется
+                        for marker in markers:
+                            position = marker['position'] + clip_start
+                            time_seconds = position / marker['sample_rate']
+                            all_markers.append({**marker,
+                                                'position': position,
+                                                'time_seconds': time_seconds,
+                                                'time_formatted': format_time(time_seconds)})
+                        self.root.after(0, self.set_progress, done)
 
             # Сохраняем результаты
             if all_markers:
                 save_markers_to_csv(all_markers, output_file)
 
-                messagebox.showinfo("Успех", f"Извлечено маркеров: {len(all_markers)}\nФайл сохранен: {output_file}")
+                self.root.after(0, self._finish_with_message, messagebox.showinfo, "Успех",
+                                f"Извлечено маркеров: {len(all_markers)}\nФайл сохранен: {output_file}")
             else:
-                messagebox.showwarning("Предупреждение", "Маркеры не найдены ни в одном файле")
+                self.root.after(0, self._finish_with_message, messagebox.showwarning,
+                                "Предупреждение", "Маркеры не найдены ни в одном файле")
 
         except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка при извлечении маркеров: {e}")
+            self.root.after(0, self._finish_with_message, messagebox.showerror,
+                            "Ошибка", f"Ошибка при извлечении маркеров: {e}")
 
 def main():
     """Основная функция"""
     print("=== Извлечение маркеров из WAV файлов с учетом позиций клипов ===\n")
 
-    # Устанавливаем необходимые пакеты
-    if not install_required_packages():
-        print("Ошибка установки необходимых пакетов")
-        return
-
     # Создаем GUI
     root = tk.Tk()
     app = MarkersExtractorGUI(root)